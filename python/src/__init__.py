@@ -10,6 +10,7 @@ __all__ = [
     "config",
     "colors",
     "fetch_async",
+    "fetch_cache",
     "fetch_threads",
     "mapping",
     "parsing",
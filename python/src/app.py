@@ -1,37 +1,201 @@
 import argparse
+import atexit
+import hashlib
 import time
 import asyncio
 import sys
 import os
 import logging
+import multiprocessing
 import threading
-from typing import List
+import httpx
+from concurrent.futures import BrokenExecutor, Future, ProcessPoolExecutor
+from typing import Dict, List, Optional, Sequence, Tuple
 
 # --- bootstrap so running as a script works ---
 if __package__ is None or __package__ == "":
     # Running as script: add parent to sys.path for "src.*" imports
     sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
     from src.config import FEEDS, API_KEY
-    from src.mapping import build_station_maps, load_layout
-    from src.fetch_async import fetch_parallel_httpx
-    from src.fetch_threads import fetch_parallel_requests
-    from src.parsing import aggregate_states_from_blobs
-    from src.render import build_led_payload, print_test_preview
-    from src.serial_frame import frame_bytes, send_serial
+    from src.mapping import build_station_maps, load_layout, restrict_stop_map
+    from src.fetch_async import iter_feeds_httpx, close_client
+    from src.fetch_threads import iter_feeds_sync, shutdown as shutdown_threaded_fetch
+    from src.parsing import parse_blob, parse_blob_in_worker, init_parse_worker, aggregate_states_from_futures
+    from src.render import make_led_payload_builder, print_test_preview
+    from src.serial_frame import frame_bytes, open_serial, close_serial, send_serial
     from src.web_server import create_app, update_data
 else:
     # Running as module: use relative imports
     from .config import FEEDS, API_KEY
-    from .mapping import build_station_maps, load_layout
-    from .fetch_async import fetch_parallel_httpx
-    from .fetch_threads import fetch_parallel_requests
-    from .parsing import aggregate_states_from_blobs
-    from .render import build_led_payload, print_test_preview
-    from .serial_frame import frame_bytes, send_serial
+    from .mapping import build_station_maps, load_layout, restrict_stop_map
+    from .fetch_async import iter_feeds_httpx, close_client
+    from .fetch_threads import iter_feeds_sync, shutdown as shutdown_threaded_fetch
+    from .parsing import parse_blob, parse_blob_in_worker, init_parse_worker, aggregate_states_from_futures
+    from .render import make_led_payload_builder, print_test_preview
+    from .serial_frame import frame_bytes, open_serial, close_serial, send_serial
     from .web_server import create_app, update_data
 
 logger = logging.getLogger(__name__)
 
+try:
+    from blake3 import blake3 as _blake3  # SIMD tree hash, several times faster than blake2b
+except ImportError:
+    _blake3 = None
+
+
+def _check_protobuf_backend() -> None:
+    """Warn if GTFS protobufs will be parsed by the pure-Python backend.
+
+    The upb (protobuf>=4.21) and cpp backends parse feeds an order of
+    magnitude faster, and parsing dominates the poll cycle.
+    """
+    try:
+        from google.protobuf.internal import api_implementation
+        backend = api_implementation.Type()
+    except Exception as e:
+        logger.debug(f"Could not determine protobuf backend: {e}")
+        return
+
+    if backend == "python":
+        logger.warning("protobuf is using the pure-Python backend; install protobuf>=4.21 for faster parsing")
+    else:
+        logger.info(f"protobuf backend: {backend}")
+
+
+def _blob_digest(blob: bytes) -> bytes:
+    """Return a short content digest used to detect unchanged feed blobs."""
+    if _blake3 is not None:
+        return _blake3(blob).digest(length=8)
+    return hashlib.blake2b(blob, digest_size=8).digest()
+
+
+# Parse futures from previous ticks, keyed by feed index: (blob digest, future).
+# A completed future doubles as the cached parse result for identical bytes.
+_parsed: Dict[int, Tuple[bytes, Future]] = {}
+
+# Parse pool shared by every tick (None = parse in the main process), and
+# what it was started with so _submit_parse can restart it if a worker dies
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_workers = 0
+_pool_stop_map: Dict[str, str] = {}
+
+# Workers are started lazily, on the first submit, when the web server,
+# asyncio resolver and fetch threads may be running. Forking a threaded
+# process can deadlock the child, so workers come from a forkserver
+# (spawn where that is unavailable, e.g. Windows); init_parse_worker
+# hands them the stop map either way.
+_POOL_START_METHOD = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+
+
+def _start_parse_pool(workers: int, stopid_to_station_key: Dict[str, str]) -> None:
+    """Start the parse pool (workers <= 0 means parse in-process).
+
+    Args:
+        workers: Number of worker processes
+        stopid_to_station_key: Stop map installed in each worker by init_parse_worker
+    """
+    global _pool, _pool_workers, _pool_stop_map
+
+    _pool_workers = workers
+    _pool_stop_map = stopid_to_station_key
+    _pool = None
+    if workers > 0:
+        _pool = ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=multiprocessing.get_context(_POOL_START_METHOD),
+            initializer=init_parse_worker,
+            initargs=(stopid_to_station_key,),
+        )
+
+
+def _shutdown_parse_pool() -> None:
+    """Stop the parse pool without waiting for queued parses (call on exit)."""
+    if _pool is not None:
+        _pool.shutdown(wait=False, cancel_futures=True)
+
+
+def _lost_to_broken_pool(fut: Future) -> bool:
+    """Whether fut failed because its worker process died, not because of its blob."""
+    return fut.done() and not fut.cancelled() and isinstance(fut.exception(), BrokenExecutor)
+
+
+def _submit_parse(
+    i: int,
+    blob: bytes,
+    stopid_to_station_key: Dict[str, str],
+) -> Tuple[Future, bool]:
+    """Return a parse future for a feed's blob, reusing the last one if unchanged.
+
+    If a pool worker has died (e.g. OOM-killed), the pool is restarted and
+    the blob resubmitted; results lost with the old pool are parsed again
+    on their next tick instead of being reused.
+
+    Args:
+        i: Feed index
+        blob: GTFS protobuf binary message
+        stopid_to_station_key: Mapping from GTFS stop ID to station complex key
+            (used when parsing in-process)
+
+    Returns:
+        Tuple of (future resolving to parse_blob's result, whether it is a new parse)
+    """
+    digest = _blob_digest(blob)
+    prev = _parsed.get(i)
+    if prev is not None and prev[0] == digest and not _lost_to_broken_pool(prev[1]):
+        return prev[1], False
+
+    if _pool is not None:
+        try:
+            fut = _pool.submit(parse_blob_in_worker, blob)
+        except BrokenExecutor as e:
+            logger.error(f"Parse pool is broken ({e}); restarting {_pool_workers} workers")
+            _shutdown_parse_pool()
+            _start_parse_pool(_pool_workers, _pool_stop_map)
+            fut = _pool.submit(parse_blob_in_worker, blob)
+    else:
+        fut = Future()
+        try:
+            fut.set_result(parse_blob(blob, stopid_to_station_key))
+        except Exception as e:
+            fut.set_exception(e)
+
+    _parsed[i] = (digest, fut)
+    return fut, True
+
+
+async def _fetch_and_submit(
+    feeds: Sequence[str],
+    stopid_to_station_key: Dict[str, str],
+) -> Tuple[List[bytes], List[Future], bool]:
+    """Fetch feeds over HTTP/2, handing each blob to the parser as it lands.
+
+    Parsing of the fastest feeds overlaps the download of the slowest.
+
+    Returns:
+        Tuple of (blobs in feed order, parse futures, whether any feed changed)
+    """
+    received: Dict[int, bytes] = {}
+    futures: List[Future] = []
+    changed = False
+
+    async for i, blob in iter_feeds_httpx(feeds, API_KEY):
+        received[i] = blob
+        fut, is_new = _submit_parse(i, blob, stopid_to_station_key)
+        futures.append(fut)
+        changed |= is_new
+
+    return [received[i] for i in sorted(received)], futures, changed
+
+
+def _close_loop(loop: asyncio.AbstractEventLoop) -> None:
+    """Close the shared HTTP/2 client and the poll event loop on exit."""
+    try:
+        loop.run_until_complete(close_client())
+    except Exception as e:
+        logger.debug(f"Error closing HTTP/2 client: {e}")
+    finally:
+        loop.close()
+
 
 def main():
     ap = argparse.ArgumentParser(description="MTA LED Board - Real-time NYC Subway visualization")
@@ -42,8 +206,10 @@ def main():
     ap.add_argument("--serial-port", default=None, help="Serial port for ESP32")
     ap.add_argument("--baud", type=int, default=2_000_000, help="Baud rate")
     ap.add_argument("--poll", type=float, default=1.0, help="Poll interval in seconds")
+    ap.add_argument("--parse-workers", type=int, default=min(len(FEEDS), os.cpu_count() or 1),
+                    help="Processes for parsing GTFS feeds (0 = parse in main process)")
     ap.add_argument("--httpx", dest="use_httpx", action="store_true", default=True, help="Use httpx (HTTP/2)")
-    ap.add_argument("--no-httpx", dest="use_httpx", action="store_false", help="Use requests (HTTP/1.1)")
+    ap.add_argument("--no-httpx", dest="use_httpx", action="store_false", help="Use threaded HTTP/1.1 fallback")
     ap.add_argument("--verbose", action="store_true", help="Enable verbose logging")
     ap.add_argument("--web", action="store_true", help="Enable web dashboard")
     ap.add_argument("--web-host", default="127.0.0.1", help="Web server host")
@@ -59,12 +225,20 @@ def main():
     )
 
     logger.info("Starting MTA LED Board")
-    logger.info(f"Using {'httpx (HTTP/2)' if args.use_httpx else 'requests (HTTP/1.1)'} backend")
+    _check_protobuf_backend()
+    logger.info(f"Using {'httpx (HTTP/2)' if args.use_httpx else 'threaded httpx (HTTP/1.1)'} backend")
 
     stopid_to_station_key, station_key_to_name, _ = build_station_maps(args.stops, args.stations)
     layout = load_layout(args.layout)
     if not layout:
         logger.warning("Layout is empty; preview works but serial payload will be empty.")
+    build_payload = make_led_payload_builder(layout)
+
+    # Serial-only runs never show stations off the strip, so don't aggregate them
+    parse_map = stopid_to_station_key
+    if args.serial_port and not args.test and not args.web:
+        parse_map = restrict_stop_map(stopid_to_station_key, layout.keys())
+        logger.info("Serial-only mode: aggregating layout stations only")
 
     use_httpx = args.use_httpx
     feeds = FEEDS
@@ -83,43 +257,74 @@ def main():
         logger.info(f"Web dashboard started at http://{args.web_host}:{args.web_port}")
         logger.info("Press Ctrl+C to stop")
 
+    # Open the serial port once for the whole run
+    if args.serial_port and not args.test:
+        open_serial(args.serial_port, args.baud)
+        atexit.register(close_serial)
+
+    # Parse feeds across processes (protobuf decoding is CPU-bound and holds the GIL)
+    _start_parse_pool(args.parse_workers, parse_map)
+    atexit.register(_shutdown_parse_pool)
+    if args.parse_workers > 0:
+        logger.info(f"Parsing feeds with {args.parse_workers} worker processes")
+
+    # One event loop for the whole run so the HTTP/2 client (and its
+    # connections) survive between polls
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    atexit.register(_close_loop, loop)
+    atexit.register(shutdown_threaded_fetch)
+
+    # Absolute schedule: slow ticks eat into the sleep instead of adding to it
+    next_tick = time.perf_counter()
+
+    # Last tick's results, reused when every feed's bytes are unchanged
+    last_state = None
+
     while True:
         t0 = time.perf_counter()
 
         blobs: List[bytes] = []
+        futures: List[Future] = []
+        changed = False
         if use_httpx:
             try:
-                blobs = asyncio.run(fetch_parallel_httpx(feeds, API_KEY))
-            except Exception as e:
-                logger.warning(f"HTTP/2 backend failed, falling back to requests: {e}")
+                blobs, futures, changed = loop.run_until_complete(
+                    _fetch_and_submit(feeds, parse_map)
+                )
+            except (ImportError, httpx.HTTPError, OSError) as e:
+                # Transport problems only (e.g. h2 missing, client setup);
+                # per-feed request errors are already handled by the fetcher
+                logger.warning(f"HTTP/2 backend failed, falling back to HTTP/1.1: {e}")
                 use_httpx = False
         if not use_httpx:
-            blobs = fetch_parallel_requests(feeds, API_KEY)
+            # Threaded HTTP/1.1: also hand each blob to the parser as it lands
+            received: Dict[int, bytes] = {}
+            futures = []
+            for i, blob in iter_feeds_sync(feeds, API_KEY):
+                received[i] = blob
+                fut, is_new = _submit_parse(i, blob, parse_map)
+                futures.append(fut)
+                changed |= is_new
+            blobs = [received[i] for i in sorted(received)]
 
         if not blobs:
             logger.error("No data received from any feed")
         else:
             logger.debug(f"Received {len(blobs)} feed responses")
 
-        routes_by_station, mode_by_station = aggregate_states_from_blobs(
-            blobs, stopid_to_station_key
-        )
-        pairs = build_led_payload(routes_by_station, mode_by_station, layout)
-        payload = frame_bytes(pairs)
+        if changed or last_state is None or last_state[0] != len(futures):
+            routes_by_station, mode_by_station, vehicle_count = aggregate_states_from_futures(futures)
+            pairs = build_payload(routes_by_station, mode_by_station)
+            payload = frame_bytes(pairs)
+            last_state = (len(futures), routes_by_station, mode_by_station, vehicle_count, pairs, payload)
+        else:
+            # Same bytes as last tick: skip parse, payload build and framing
+            logger.debug("Feed data unchanged; reusing last payload")
+            _, routes_by_station, mode_by_station, vehicle_count, pairs, payload = last_state
 
         # Update web dashboard if enabled
         if args.web:
-            # Count vehicles from blobs
-            vehicle_count = 0
-            from google.transit import gtfs_realtime_pb2 as gtfs
-            feed = gtfs.FeedMessage()
-            for blob in blobs:
-                try:
-                    feed.ParseFromString(blob)
-                    vehicle_count += sum(1 for e in feed.entity if e.HasField('vehicle'))
-                except:
-                    pass
-
             update_data(
                 routes_by_station,
                 mode_by_station,
@@ -136,7 +341,12 @@ def main():
             send_serial(args.serial_port, args.baud, payload)
             logger.info(f"Sent {len(pairs)} stations in {t_ms:.1f} ms")
 
-        time.sleep(max(0.0, args.poll))
+        next_tick += args.poll
+        now = time.perf_counter()
+        if now - next_tick > args.poll:
+            # More than a period behind: resync rather than burst to catch up
+            next_tick = now
+        time.sleep(max(0.0, next_tick - now))
 
 
 if __name__ == "__main__":
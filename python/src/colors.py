@@ -1,4 +1,5 @@
-from typing import Dict, Tuple, Iterable
+from functools import lru_cache
+from typing import Dict, FrozenSet, Tuple, Iterable
 
 ROUTE_RGB: Dict[str, Tuple[int, int, int]] = {
     "A": (0, 57, 166), "C": (0, 57, 166), "E": (0, 57, 166),
@@ -19,16 +20,23 @@ LETTER_PRIORITY = ["A","B","C","D","E","F","G","J","L","M","N","Q","R","W","Z"]
 DIGIT_PRIORITY  = [str(i) for i in range(1,8)]
 TAIL_PRIORITY   = ["S","FS","H","SI"]
 
+# Flat priority table: route -> rank (lower wins)
+_RANK: Dict[str, int] = {r: i for i, r in enumerate(LETTER_PRIORITY + DIGIT_PRIORITY + TAIL_PRIORITY)}
+_DEFAULT_RGB = (80, 80, 80)
+
+@lru_cache(maxsize=4096)
+def _choose_color_cached(routes: FrozenSet[str]) -> Tuple[int, int, int]:
+    normalized = {(r or "").strip().upper() for r in routes}
+    best = min(normalized, key=lambda r: _RANK.get(r, len(_RANK)), default=None)
+    return ROUTE_RGB.get(best, _DEFAULT_RGB)
+
 def choose_color_for_routes(routes: Iterable[str]) -> Tuple[int, int, int]:
-    uniq = [r for r in { (r or "").strip().upper() for r in routes } if r]
-    if not uniq:
-        return (80, 80, 80)
-    for code in LETTER_PRIORITY:
-        if code in uniq: return ROUTE_RGB.get(code, (80,80,80))
-    for code in DIGIT_PRIORITY:
-        if code in uniq: return ROUTE_RGB.get(code, (80,80,80))
-    for code in TAIL_PRIORITY:
-        if code in uniq: return ROUTE_RGB.get(code, (80,80,80))
-    for r in uniq:
-        if r in ROUTE_RGB: return ROUTE_RGB[r]
-    return (80, 80, 80)
+    # No trains' routes known: skip hashing entirely
+    if not routes:
+        return _DEFAULT_RGB
+    # frozenset is an order-free cache key ({A,C} and {C,A} share a slot) and
+    # is cheap to build from the small route sets; normalization happens
+    # inside the cached call, once per distinct set
+    if not isinstance(routes, frozenset):
+        routes = frozenset(routes)
+    return _choose_color_cached(routes)
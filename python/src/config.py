@@ -1,8 +1,8 @@
 import os
 from enum import IntEnum
 
-# Feed list
-FEEDS = [
+# Feed list (tuple: immutable; the fetch cache is indexed by position, see fetch_cache.bind_feeds)
+FEEDS = (
     "https://api-endpoint.mta.info/Dataservice/mtagtfsfeeds/nyct%2Fgtfs-ace",
     "https://api-endpoint.mta.info/Dataservice/mtagtfsfeeds/nyct%2Fgtfs-bdfm",
     "https://api-endpoint.mta.info/Dataservice/mtagtfsfeeds/nyct%2Fgtfs-g",
@@ -10,7 +10,7 @@ FEEDS = [
     "https://api-endpoint.mta.info/Dataservice/mtagtfsfeeds/nyct%2Fgtfs-nqrw",
     "https://api-endpoint.mta.info/Dataservice/mtagtfsfeeds/nyct%2Fgtfs-l",
     "https://api-endpoint.mta.info/Dataservice/mtagtfsfeeds/nyct%2Fgtfs",  # 1/2/3/4/5/6/7/S
-]
+)
 
 # API key is optional (MTA feeds work without authentication)
 API_KEY = os.getenv("MTA_API_KEY")
@@ -19,6 +19,11 @@ API_KEY = os.getenv("MTA_API_KEY")
 TIMEOUT_CONNECT = 1.5
 TIMEOUT_READ = 4.0
 
+# Connection pool size for both fetchers (override with MTA_MAX_CONCURRENT_FETCHES).
+# Default 2x the feed count keeps every feed's connection warm with headroom for
+# a retry; larger values only cost idle sockets and memory.
+MAX_CONCURRENT_FETCHES = int(os.getenv("MTA_MAX_CONCURRENT_FETCHES", str(len(FEEDS) * 2)))
+
 # Feed caching (in seconds)
 # MTA updates feeds approximately every 30 seconds
 # Lower values = more responsive but higher server load
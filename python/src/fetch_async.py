@@ -1,24 +1,165 @@
-from typing import List, Optional
+from typing import AsyncIterator, List, Optional, Sequence, Tuple
 import asyncio
 import logging
-import time
 import httpx
 
 try:
-    from .config import TIMEOUT_CONNECT, TIMEOUT_READ, FEED_CACHE_SECONDS
+    from .config import MAX_CONCURRENT_FETCHES, TIMEOUT_CONNECT, TIMEOUT_READ
+    from .fetch_cache import (
+        FeedResult, build_headers, start_poll, conditional_headers, read_response, record_result,
+        finish_poll,
+    )
 except ImportError:
-    from src.config import TIMEOUT_CONNECT, TIMEOUT_READ, FEED_CACHE_SECONDS
+    from src.config import MAX_CONCURRENT_FETCHES, TIMEOUT_CONNECT, TIMEOUT_READ
+    from src.fetch_cache import (
+        FeedResult, build_headers, start_poll, conditional_headers, read_response, record_result,
+        finish_poll,
+    )
 
 logger = logging.getLogger(__name__)
 
-# In-memory cache for GTFS feeds
-_feed_cache: Optional[List[bytes]] = None
-_cache_timestamp: float = 0.0
-_cache_etags: dict = {}  # URL -> ETag mapping
-_cache_last_modified: dict = {}  # URL -> Last-Modified mapping
+# Shared HTTP/2 client (keeps TLS connections and streams alive across polls)
+_client: Optional[httpx.AsyncClient] = None
+_client_http2 = False
+_client_loop: Optional[asyncio.AbstractEventLoop] = None  # loop the client's connections belong to
 
+# Whether the server actually negotiated HTTP/2 (None until first response)
+_negotiated_h2: Optional[bool] = None
 
-async def fetch_parallel_httpx(feeds: List[str], api_key: Optional[str]) -> List[bytes]:
+
+def get_client(api_key: Optional[str]) -> httpx.AsyncClient:
+    """Return the shared HTTP/2 client, creating it on first use.
+
+    Must be called from a running event loop. The client is bound to that
+    loop, so callers should drive every poll from the same one (see
+    app.main); _client_for_loop rebuilds it if the loop changes. If the
+    server turned out not to speak HTTP/2, the client is built for
+    HTTP/1.1 to skip the h2 ALPN/SETTINGS overhead.
+
+    Args:
+        api_key: Optional API key (included in x-api-key header if provided)
+
+    Returns:
+        Cached httpx.AsyncClient
+    """
+    global _client, _client_http2, _client_loop
+
+    if _client is None or _client.is_closed:
+        _client_http2 = _negotiated_h2 is not False
+        limits = httpx.Limits(
+            max_keepalive_connections=MAX_CONCURRENT_FETCHES, max_connections=MAX_CONCURRENT_FETCHES
+        )
+        timeout = httpx.Timeout(TIMEOUT_CONNECT + TIMEOUT_READ)
+        _client = httpx.AsyncClient(
+            http2=_client_http2, headers=build_headers(api_key), limits=limits, timeout=timeout
+        )
+        _client_loop = asyncio.get_running_loop()
+        logger.debug("Created shared %s client", "HTTP/2" if _client_http2 else "HTTP/1.1")
+
+    return _client
+
+
+async def close_client() -> None:
+    """Close the shared HTTP/2 client (call once on shutdown)."""
+    global _client, _client_loop
+
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+        _client_loop = None
+
+
+async def _client_for_loop(api_key: Optional[str]) -> httpx.AsyncClient:
+    """Return the shared client, rebuilding it if the event loop changed.
+
+    A client whose connections belong to another (possibly closed) loop
+    fails with "Event loop is closed", e.g. when a caller uses asyncio.run
+    per poll.
+    """
+    global _client, _client_loop
+
+    if _client is not None and _client_loop is not asyncio.get_running_loop():
+        logger.debug("Event loop changed; rebuilding shared HTTP client")
+        try:
+            await _client.aclose()
+        except Exception as e:
+            logger.debug("Error closing client from previous loop: %s", e)
+        _client = None
+        _client_loop = None
+
+    return get_client(api_key)
+
+
+def _note_protocol(r: httpx.Response) -> None:
+    """Record which HTTP version the server negotiated (first response only)."""
+    global _negotiated_h2
+
+    if _negotiated_h2 is None:
+        _negotiated_h2 = r.http_version == "HTTP/2"
+        logger.info("Feed server negotiated %s", r.http_version)
+
+
+async def iter_feeds_httpx(feeds: Sequence[str], api_key: Optional[str]) -> AsyncIterator[Tuple[int, bytes]]:
+    """Fetch GTFS feeds in parallel over HTTP/2, yielding each as it lands.
+
+    Yields feeds in completion order rather than feed order so callers can
+    start parsing the fastest feeds while the slowest are still in flight.
+    Uses the shared ETag/Last-Modified cache; unchanged feeds yield their
+    cached blob.
+
+    Args:
+        feeds: List of feed URLs
+        api_key: Optional API key (included in x-api-key header if provided)
+
+    Yields:
+        (feed_index, blob) for every feed that has data
+    """
+    cached = start_poll(feeds)
+    if cached is not None:
+        for i, blob in cached:
+            yield i, blob
+        return
+
+    client = await _client_for_loop(api_key)
+
+    async def _one(i: int, url: str) -> Tuple[int, FeedResult]:
+        """Fetch one feed with conditional request support.
+
+        Returns: (feed_index, (content, etag, last_modified) or None if unchanged)
+        """
+        try:
+            # Add conditional headers if we have cached values
+            headers = conditional_headers(i)
+
+            logger.debug("Fetching %s (conditional: %s)", url, bool(headers))
+            r = await client.get(url, headers=headers)
+            _note_protocol(r)
+            return i, read_response(url, r)
+        except httpx.TimeoutException as e:
+            logger.warning("Timeout fetching %s: %s", url, e)
+        except httpx.HTTPStatusError as e:
+            logger.error("HTTP error %d from %s", e.response.status_code, url)
+        except httpx.RequestError as e:
+            logger.error("Request error fetching %s: %s", url, e)
+        except Exception as e:
+            logger.error("Unexpected error fetching %s: %s", url, e)
+        return i, None
+
+    for next_done in asyncio.as_completed([_one(i, u) for i, u in enumerate(feeds)]):
+        i, result = await next_done
+        blob = record_result(i, result)
+        if blob is not None:
+            yield i, blob
+
+    finish_poll()
+
+    # Server doesn't speak h2: rebuild as HTTP/1.1 on the next poll
+    if _client_http2 and _negotiated_h2 is False:
+        logger.info("HTTP/2 not negotiated; switching shared client to HTTP/1.1")
+        await close_client()
+
+
+async def fetch_parallel_httpx(feeds: Sequence[str], api_key: Optional[str]) -> List[bytes]:
     """Fetch GTFS feeds in parallel using HTTP/2.
 
     Uses smart caching with ETag and Last-Modified headers to detect
@@ -30,109 +171,9 @@ async def fetch_parallel_httpx(feeds: List[str], api_key: Optional[str]) -> List
         api_key: Optional API key (included in x-api-key header if provided)
 
     Returns:
-        List of non-None blob responses
+        List of non-None blob responses, in feed order
     """
-    global _feed_cache, _cache_timestamp, _cache_etags, _cache_last_modified
-
-    # Minimum time between checks (avoid hammering server)
-    now = time.time()
-    if _feed_cache and (now - _cache_timestamp) < FEED_CACHE_SECONDS:
-        age = now - _cache_timestamp
-        logger.debug(f"Time-based cache valid (age: {age:.1f}s)")
-        return _feed_cache
-
-    base_headers = {
-        "Accept-Encoding": "gzip, deflate",
-        "User-Agent": "gtfs-led-board/2.0"
-    }
-    if api_key:
-        base_headers["x-api-key"] = api_key
-
-    limits = httpx.Limits(max_keepalive_connections=20, max_connections=40)
-    timeout = httpx.Timeout(TIMEOUT_CONNECT + TIMEOUT_READ)
-
-    async with httpx.AsyncClient(http2=True, headers=base_headers, limits=limits, timeout=timeout) as client:
-        async def _one(url: str) -> Optional[tuple]:
-            """Fetch one feed with conditional request support.
-
-            Returns: (content, etag, last_modified) or None if unchanged
-            """
-            try:
-                # Add conditional headers if we have cached values
-                headers = {}
-                if url in _cache_etags:
-                    headers["If-None-Match"] = _cache_etags[url]
-                if url in _cache_last_modified:
-                    headers["If-Modified-Since"] = _cache_last_modified[url]
-
-                logger.debug(f"Fetching {url} (conditional: {bool(headers)})")
-                r = await client.get(url, headers=headers)
-
-                # 304 Not Modified - data hasn't changed
-                if r.status_code == 304:
-                    logger.debug(f"Feed unchanged: {url}")
-                    return None
-
-                r.raise_for_status()
-
-                # Extract caching headers
-                etag = r.headers.get("ETag")
-                last_modified = r.headers.get("Last-Modified")
-
-                logger.debug(f"Successfully fetched {len(r.content)} bytes from {url}")
-                return (r.content, etag, last_modified)
-            except httpx.TimeoutException as e:
-                logger.warning(f"Timeout fetching {url}: {e}")
-                return None
-            except httpx.HTTPStatusError as e:
-                # Don't treat 304 as error
-                if e.response.status_code != 304:
-                    logger.error(f"HTTP error {e.response.status_code} from {url}")
-                return None
-            except httpx.RequestError as e:
-                logger.error(f"Request error fetching {url}: {e}")
-                return None
-            except Exception as e:
-                logger.error(f"Unexpected error fetching {url}: {e}")
-                return None
-
-        results = await asyncio.gather(*(_one(u) for u in feeds))
-
-    # Process results
-    updated_count = 0
-    unchanged_count = 0
-    new_feeds = []
-
-    for i, result in enumerate(results):
-        if result is None:
-            # Either error or 304 Not Modified
-            if _feed_cache and i < len(_feed_cache):
-                unchanged_count += 1
-            continue
-
-        content, etag, last_modified = result
-        updated_count += 1
-        new_feeds.append(content)
-
-        # Update cache headers
-        url = feeds[i]
-        if etag:
-            _cache_etags[url] = etag
-        if last_modified:
-            _cache_last_modified[url] = last_modified
-
-    # If nothing changed, return old cache
-    if unchanged_count > 0 and updated_count == 0 and _feed_cache:
-        logger.info(f"All feeds unchanged ({unchanged_count}/{len(feeds)}) - using cache")
-        _cache_timestamp = time.time()  # Reset timer
-        return _feed_cache
-
-    # Mix of updated and unchanged feeds
-    if updated_count > 0:
-        logger.info(f"Feeds updated: {updated_count}, unchanged: {unchanged_count}")
-        _feed_cache = new_feeds
-        _cache_timestamp = time.time()
-        return new_feeds
-
-    # Fallback
-    return new_feeds if new_feeds else (_feed_cache or [])
+    received = {}
+    async for i, blob in iter_feeds_httpx(feeds, api_key):
+        received[i] = blob
+    return [received[i] for i in sorted(received)]
@@ -0,0 +1,224 @@
+from typing import Dict, List, Optional, Sequence, Tuple
+import logging
+import time
+
+try:
+    from .config import FEED_CACHE_SECONDS
+except ImportError:
+    from src.config import FEED_CACHE_SECONDS
+
+logger = logging.getLogger(__name__)
+
+# Result of one feed request: (content, etag, last_modified), or None if
+# the feed was unchanged (304) or the request failed
+FeedResult = Optional[Tuple[bytes, Optional[str], Optional[str]]]
+
+# Conditional-request state shared by the async and threaded fetchers.
+# Slots are indexed by feed position (see bind_feeds) so the hot path does
+# list indexing instead of hashing the long feed URLs.
+_feeds: Sequence[str] = ()
+_feed_blobs: List[Optional[bytes]] = []  # feed idx -> last downloaded body
+_cache_etags: List[Optional[str]] = []  # feed idx -> ETag
+_cache_last_modified: List[Optional[str]] = []  # feed idx -> Last-Modified
+_cache_timestamp: float = 0.0
+
+# Outcome tallies for the poll in progress (reset by start_poll)
+_poll_updated = 0
+_poll_unchanged = 0
+
+
+def _accept_encoding() -> str:
+    """Advertise zstd/brotli only when httpx can decode them.
+
+    httpx decodes br with the brotli package and zstd with zstandard;
+    both compress GTFS protobufs tighter than gzip.
+    """
+    encodings = []
+    try:
+        import zstandard  # noqa: F401
+        encodings.append("zstd")
+    except ImportError:
+        pass
+    try:
+        import brotli  # noqa: F401
+        encodings.append("br")
+    except ImportError:
+        try:
+            import brotlicffi  # noqa: F401
+            encodings.append("br")
+        except ImportError:
+            pass
+    encodings += ["gzip", "deflate"]
+    return ", ".join(encodings)
+
+
+ACCEPT_ENCODING = _accept_encoding()
+
+
+def build_headers(api_key: Optional[str]) -> Dict[str, str]:
+    """Build the base request headers used by both fetchers.
+
+    Args:
+        api_key: Optional API key (included in x-api-key header if provided)
+
+    Returns:
+        Header dictionary
+    """
+    headers = {
+        "Accept-Encoding": ACCEPT_ENCODING,
+        "User-Agent": "gtfs-led-board/2.0"
+    }
+    if api_key:
+        headers["x-api-key"] = api_key
+    return headers
+
+
+def bind_feeds(feeds: Sequence[str]) -> None:
+    """Index the cache by position in this feed list.
+
+    Cheap when called with the same list every poll (identity check); a
+    different feed list resets the cache.
+
+    Args:
+        feeds: List of feed URLs
+    """
+    global _feeds, _feed_blobs, _cache_etags, _cache_last_modified, _cache_timestamp
+
+    if feeds is _feeds:
+        return
+    if tuple(feeds) != tuple(_feeds):
+        n = len(feeds)
+        _feed_blobs = [None] * n
+        _cache_etags = [None] * n
+        _cache_last_modified = [None] * n
+        _cache_timestamp = 0.0
+    _feeds = feeds
+
+
+def cache_is_fresh() -> bool:
+    """Return True if the feeds were checked under FEED_CACHE_SECONDS ago."""
+    age = time.time() - _cache_timestamp
+    if age < FEED_CACHE_SECONDS:
+        logger.debug("Time-based cache valid (age: %.1fs)", age)
+        return True
+    return False
+
+
+def start_poll(feeds: Sequence[str]) -> Optional[List[Tuple[int, bytes]]]:
+    """Begin a poll of feeds, short-circuiting if they were checked recently.
+
+    Both fetchers call this first, then record_result for each feed as it
+    completes, then finish_poll.
+
+    Args:
+        feeds: List of feed URLs
+
+    Returns:
+        (feed_index, blob) for every cached feed if the last check was under
+        FEED_CACHE_SECONDS ago, or None if the feeds should be re-checked
+    """
+    global _poll_updated, _poll_unchanged
+
+    bind_feeds(feeds)
+    _poll_updated = 0
+    _poll_unchanged = 0
+
+    # Minimum time between checks (avoid hammering server)
+    if cache_is_fresh():
+        return [(i, blob) for i, blob in enumerate(_feed_blobs) if blob is not None]
+    return None
+
+
+def conditional_headers(idx: int) -> Dict[str, str]:
+    """Build If-None-Match / If-Modified-Since headers for a feed.
+
+    Args:
+        idx: Feed index
+
+    Returns:
+        Header dictionary (empty if the feed has never been downloaded)
+    """
+    headers = {}
+    etag = _cache_etags[idx]
+    if etag:
+        headers["If-None-Match"] = etag
+    last_modified = _cache_last_modified[idx]
+    if last_modified:
+        headers["If-Modified-Since"] = last_modified
+    return headers
+
+
+def read_response(url: str, r) -> FeedResult:
+    """Turn an httpx response into a FeedResult.
+
+    Args:
+        url: Feed URL (for logging)
+        r: httpx.Response
+
+    Returns:
+        (content, etag, last_modified), or None if the feed is unchanged
+
+    Raises:
+        httpx.HTTPStatusError: On non-2xx/304 responses
+    """
+    # 304 Not Modified - data hasn't changed
+    if r.status_code == 304:
+        logger.debug("Feed unchanged: %s", url)
+        return None
+
+    r.raise_for_status()
+
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug(
+            "Successfully fetched %d bytes from %s (encoding: %s)",
+            len(r.content), url, r.headers.get("Content-Encoding", "identity"),
+        )
+    return (r.content, r.headers.get("ETag"), r.headers.get("Last-Modified"))
+
+
+def record_result(idx: int, result: FeedResult) -> Optional[bytes]:
+    """Store a fresh download (if any) and return the feed's current blob.
+
+    Feeds that were unchanged (or failed) keep their previously downloaded
+    body, so a partial update never drops the other feeds' trains.
+
+    Args:
+        idx: Feed index
+        result: FeedResult for this feed
+
+    Returns:
+        Current blob for the feed, or None if it was never downloaded
+    """
+    global _poll_updated, _poll_unchanged
+
+    if result is None:
+        # Either error or 304 Not Modified
+        blob = _feed_blobs[idx]
+        if blob is not None:
+            _poll_unchanged += 1
+        return blob
+
+    _poll_updated += 1
+    content, etag, last_modified = result
+    _feed_blobs[idx] = content
+
+    # Update cache headers
+    if etag:
+        _cache_etags[idx] = etag
+    if last_modified:
+        _cache_last_modified[idx] = last_modified
+    return content
+
+
+def finish_poll() -> None:
+    """Log the outcome of the poll and restart the time-based cache window."""
+    global _cache_timestamp
+
+    total = len(_feeds)
+    if _poll_updated == 0 and _poll_unchanged > 0:
+        logger.info("All feeds unchanged (%d/%d) - using cache", _poll_unchanged, total)
+    elif _poll_updated > 0:
+        logger.info("Feeds updated: %d, unchanged: %d", _poll_updated, _poll_unchanged)
+
+    if _poll_updated or _poll_unchanged:
+        _cache_timestamp = time.time()
@@ -1,174 +1,197 @@
-from typing import List, Optional
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+from concurrent.futures import ThreadPoolExecutor, as_completed
 import logging
 import time
-import requests
-from requests.adapters import HTTPAdapter
-from urllib3.util.retry import Retry
+import httpx
 
 try:
-    from .config import TIMEOUT_CONNECT, TIMEOUT_READ, FEED_CACHE_SECONDS
+    from .config import MAX_CONCURRENT_FETCHES, TIMEOUT_CONNECT, TIMEOUT_READ
+    from .fetch_cache import (
+        FeedResult, build_headers, start_poll, conditional_headers, read_response, record_result,
+        finish_poll,
+    )
 except ImportError:
-    from src.config import TIMEOUT_CONNECT, TIMEOUT_READ, FEED_CACHE_SECONDS
+    from src.config import MAX_CONCURRENT_FETCHES, TIMEOUT_CONNECT, TIMEOUT_READ
+    from src.fetch_cache import (
+        FeedResult, build_headers, start_poll, conditional_headers, read_response, record_result,
+        finish_poll,
+    )
 
 logger = logging.getLogger(__name__)
 
-# In-memory cache for GTFS feeds
-_feed_cache: Optional[List[bytes]] = None
-_cache_timestamp: float = 0.0
-_cache_etags: dict = {}  # URL -> ETag mapping
-_cache_last_modified: dict = {}  # URL -> Last-Modified mapping
+# Clients and worker pool reused across polls (keeps connections alive)
+_client_cache: Dict[Optional[str], httpx.Client] = {}
+_executor: Optional[ThreadPoolExecutor] = None
+_executor_workers = 0
+
+# Read errors and these statuses are retried per feed (connect errors are
+# retried by the transport), with backoff _RETRY_BACKOFF * 2**(n-1)
+_RETRIES = 2
+_RETRY_BACKOFF = 0.15
+_RETRY_STATUSES = frozenset((429, 500, 502, 503, 504))
 
 
-def build_requests_session(api_key: Optional[str]) -> requests.Session:
-    """Build a requests session with retry logic and connection pooling.
+def build_sync_client(api_key: Optional[str]) -> httpx.Client:
+    """Build an HTTP/1.1 client with connect retries and connection pooling.
+
+    Read errors and 429/5xx responses are retried per request by
+    _get_with_retries.
 
     Args:
         api_key: Optional API key (included in x-api-key header if provided)
 
     Returns:
-        Configured requests.Session
+        Configured httpx.Client
     """
-    sess = requests.Session()
-    headers = {
-        "Accept-Encoding": "gzip, deflate",
-        "User-Agent": "gtfs-led-board/2.0"
-    }
-    if api_key:
-        headers["x-api-key"] = api_key
-
-    sess.headers.update(headers)
-    retry = Retry(
-        total=2,
-        connect=2,
-        read=2,
-        backoff_factor=0.15,
-        status_forcelist=(429, 500, 502, 503, 504),
-        allowed_methods=["GET"]
+    limits = httpx.Limits(
+        max_keepalive_connections=MAX_CONCURRENT_FETCHES, max_connections=MAX_CONCURRENT_FETCHES
     )
-    adapter = HTTPAdapter(pool_connections=16, pool_maxsize=32, max_retries=retry)
-    sess.mount("https://", adapter)
-    sess.mount("http://", adapter)
-    return sess
-
+    transport = httpx.HTTPTransport(http1=True, http2=False, limits=limits, retries=2)
+    timeout = httpx.Timeout(TIMEOUT_READ, connect=TIMEOUT_CONNECT)
+    return httpx.Client(headers=build_headers(api_key), transport=transport, timeout=timeout)
 
-def fetch_parallel_requests(feeds: List[str], api_key: Optional[str]) -> List[bytes]:
-    """Fetch GTFS feeds in parallel using threaded requests.
 
-    Uses smart caching with ETag and Last-Modified headers to detect
-    when MTA actually updates the data. Falls back to time-based cache
-    if conditional requests aren't supported.
+def get_client(api_key: Optional[str]) -> httpx.Client:
+    """Return a cached client for this API key, building it on first use.
 
     Args:
-        feeds: List of feed URLs
-        api_key: Optional API key
+        api_key: Optional API key (included in x-api-key header if provided)
+
+    Returns:
+        Shared httpx.Client
+    """
+    client = _client_cache.get(api_key)
+    if client is None:
+        client = build_sync_client(api_key)
+        _client_cache[api_key] = client
+    return client
+
+
+def _get_with_retries(client: httpx.Client, url: str, headers: Dict[str, str]) -> httpx.Response:
+    """GET url, retrying read errors and retryable statuses up to _RETRIES times.
 
     Returns:
-        List of non-None blob responses
+        The last response (possibly still a retryable status)
+
+    Raises:
+        httpx.RequestError: If the final attempt fails
     """
-    global _feed_cache, _cache_timestamp, _cache_etags, _cache_last_modified
+    for attempt in range(_RETRIES + 1):
+        if attempt:
+            time.sleep(_RETRY_BACKOFF * 2 ** (attempt - 1))
+        try:
+            r = client.get(url, headers=headers)
+        except (httpx.ReadError, httpx.ReadTimeout, httpx.RemoteProtocolError) as e:
+            if attempt == _RETRIES:
+                raise
+            logger.debug("Read error from %s, retrying: %s", url, e)
+            continue
+        if r.status_code not in _RETRY_STATUSES or attempt == _RETRIES:
+            return r
+        logger.debug("HTTP %d from %s, retrying", r.status_code, url)
+
+
+def _get_executor(workers: int) -> ThreadPoolExecutor:
+    """Return the shared fetch pool, growing it if more feeds are requested."""
+    global _executor, _executor_workers
+
+    if _executor is None or _executor_workers < workers:
+        if _executor is not None:
+            _executor.shutdown(wait=False)
+        _executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="feed-fetch")
+        _executor_workers = workers
+    return _executor
+
+
+def shutdown() -> None:
+    """Close the cached clients and stop the fetch pool (call once on exit)."""
+    global _executor, _executor_workers
+
+    for client in _client_cache.values():
+        try:
+            client.close()
+        except Exception as e:
+            logger.debug("Error closing HTTP client: %s", e)
+    _client_cache.clear()
+
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
+        _executor_workers = 0
 
-    # Minimum time between checks (avoid hammering server)
-    now = time.time()
-    if _feed_cache and (now - _cache_timestamp) < FEED_CACHE_SECONDS:
-        age = now - _cache_timestamp
-        logger.debug(f"Time-based cache valid (age: {age:.1f}s)")
-        return _feed_cache
 
-    from concurrent.futures import ThreadPoolExecutor, as_completed
+def iter_feeds_sync(feeds: Sequence[str], api_key: Optional[str]) -> Iterator[Tuple[int, bytes]]:
+    """Fetch GTFS feeds in parallel using threads and HTTP/1.1, yielding each as it lands.
 
-    sess = build_requests_session(api_key)
+    Threaded counterpart of fetch_async.iter_feeds_httpx: feeds come out
+    in completion order so callers can start parsing the fastest ones
+    while the slowest are still downloading. Shares the ETag/Last-Modified
+    cache with fetch_async, so switching backends mid-run keeps
+    conditional requests working.
 
-    def _one(url: str) -> Optional[tuple]:
+    Args:
+        feeds: List of feed URLs
+        api_key: Optional API key
+
+    Yields:
+        (feed_index, blob) for every feed that has data
+    """
+    cached = start_poll(feeds)
+    if cached is not None:
+        for i, blob in cached:
+            yield i, blob
+        return
+
+    client = get_client(api_key)
+
+    def _one(i: int, url: str) -> FeedResult:
         """Fetch one feed with conditional request support.
 
         Returns: (content, etag, last_modified) or None if unchanged
         """
         try:
             # Add conditional headers if we have cached values
-            headers = {}
-            if url in _cache_etags:
-                headers["If-None-Match"] = _cache_etags[url]
-            if url in _cache_last_modified:
-                headers["If-Modified-Since"] = _cache_last_modified[url]
-
-            logger.debug(f"Fetching {url} (conditional: {bool(headers)})")
-            r = sess.get(url, timeout=(TIMEOUT_CONNECT, TIMEOUT_READ), headers=headers)
-
-            # 304 Not Modified - data hasn't changed
-            if r.status_code == 304:
-                logger.debug(f"Feed unchanged: {url}")
-                return None
-
-            r.raise_for_status()
-
-            # Extract caching headers
-            etag = r.headers.get("ETag")
-            last_modified = r.headers.get("Last-Modified")
-
-            logger.debug(f"Successfully fetched {len(r.content)} bytes from {url}")
-            return (r.content, etag, last_modified)
-        except requests.Timeout as e:
-            logger.warning(f"Timeout fetching {url}: {e}")
+            headers = conditional_headers(i)
+
+            logger.debug("Fetching %s (conditional: %s)", url, bool(headers))
+            r = _get_with_retries(client, url, headers)
+            return read_response(url, r)
+        except httpx.TimeoutException as e:
+            logger.warning("Timeout fetching %s: %s", url, e)
             return None
-        except requests.HTTPError as e:
-            # Don't treat 304 as error
-            if e.response.status_code != 304:
-                logger.error(f"HTTP error {e.response.status_code} from {url}")
+        except httpx.HTTPStatusError as e:
+            logger.error("HTTP error %d from %s", e.response.status_code, url)
             return None
-        except requests.RequestException as e:
-            logger.error(f"Request error fetching {url}: {e}")
+        except httpx.RequestError as e:
+            logger.error("Request error fetching %s: %s", url, e)
             return None
         except Exception as e:
-            logger.error(f"Unexpected error fetching {url}: {e}")
+            logger.error("Unexpected error fetching %s: %s", url, e)
             return None
 
-    # Fetch all feeds
-    results = []
-    with ThreadPoolExecutor(max_workers=len(feeds)) as ex:
-        futs = {ex.submit(_one, url): i for i, url in enumerate(feeds)}
-        for fut in as_completed(futs):
-            idx = futs[fut]
-            result = fut.result()
-            results.append((idx, result))
-
-    # Sort by original order
-    results.sort(key=lambda x: x[0])
-
-    # Process results
-    updated_count = 0
-    unchanged_count = 0
-    new_feeds = []
-
-    for idx, result in results:
-        if result is None:
-            # Either error or 304 Not Modified
-            if _feed_cache and idx < len(_feed_cache):
-                unchanged_count += 1
-            continue
+    ex = _get_executor(len(feeds))
+    futs = {ex.submit(_one, i, url): i for i, url in enumerate(feeds)}
+    for fut in as_completed(futs):
+        i = futs[fut]
+        result = fut.result()
+        blob = record_result(i, result)
+        if blob is not None:
+            yield i, blob
+
+    finish_poll()
+
 
-        content, etag, last_modified = result
-        updated_count += 1
-        new_feeds.append(content)
-
-        # Update cache headers
-        url = feeds[idx]
-        if etag:
-            _cache_etags[url] = etag
-        if last_modified:
-            _cache_last_modified[url] = last_modified
-
-    # If nothing changed, return old cache
-    if unchanged_count > 0 and updated_count == 0 and _feed_cache:
-        logger.info(f"All feeds unchanged ({unchanged_count}/{len(feeds)}) - using cache")
-        _cache_timestamp = time.time()  # Reset timer
-        return _feed_cache
-
-    # Mix of updated and unchanged feeds
-    if updated_count > 0:
-        logger.info(f"Feeds updated: {updated_count}, unchanged: {unchanged_count}")
-        _feed_cache = new_feeds
-        _cache_timestamp = time.time()
-        return new_feeds
-
-    # Fallback
-    return new_feeds if new_feeds else (_feed_cache or [])
+def fetch_sync_httpx(feeds: Sequence[str], api_key: Optional[str]) -> List[bytes]:
+    """Fetch GTFS feeds in parallel using threads and HTTP/1.1.
+
+    Fallback for when the HTTP/2 path is unavailable.
+
+    Args:
+        feeds: List of feed URLs
+        api_key: Optional API key
+
+    Returns:
+        List of non-None blob responses, in feed order
+    """
+    received = dict(iter_feeds_sync(feeds, api_key))
+    return [received[i] for i in sorted(received)]
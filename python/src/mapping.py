@@ -1,17 +1,20 @@
-from typing import Dict, Set, Tuple
+from typing import Dict, Iterable, Iterator, Optional, Sequence, Set, Tuple
+import csv
 import logging
+from functools import lru_cache
+import hashlib
+import json
 import os
-import pickle
-import pandas as pd
-import numpy as np
 
 logger = logging.getLogger(__name__)
 
 # Cache file for station mappings (speeds up startup significantly)
 CACHE_DIR = ".cache"
-CACHE_FILE = os.path.join(CACHE_DIR, "station_mappings.pkl")
+CACHE_FILE = os.path.join(CACHE_DIR, "station_mappings.json")
+CACHE_VERSION = 2
 
 
+@lru_cache(maxsize=8192)
 def base_stop_id(sid: str) -> str:
     """Remove directional suffix (N/S) from GTFS stop ID.
 
@@ -21,7 +24,48 @@ def base_stop_id(sid: str) -> str:
         "F15" → "F15"
     """
     sid = (sid or "").strip().upper()
-    return sid[:-1] if len(sid) > 1 and sid[-1] in ("N", "S") else sid
+    return sid[:-1] if len(sid) > 1 and sid.endswith(("N", "S")) else sid
+
+
+def _read_csv_rows(path: str, columns: Sequence[str]) -> Iterator[Dict[str, Optional[str]]]:
+    """Yield CSV rows as dicts of the given columns, with empty fields as None.
+
+    Only the requested columns are picked out of each row (stops.txt has a
+    dozen more), and columns missing from the header are left out of the
+    dicts, so callers can test for them with ``in``.
+    """
+    with open(path, newline="", encoding="utf-8-sig") as f:
+        reader = csv.reader(f)
+        header = next(reader, [])
+        picks = [(name, header.index(name)) for name in columns if name in header]
+        for row in reader:
+            if not row:
+                continue
+            yield {
+                name: (row[i] or None) if i < len(row) else None
+                for name, i in picks
+            }
+
+
+def _file_digest(path: str) -> str:
+    """Return a content hash of a file (used to key the mapping cache)."""
+    with open(path, "rb") as f:
+        return hashlib.blake2b(f.read(), digest_size=16).hexdigest()
+
+
+def _with_directional_ids(stopid_to_station_key: Dict[str, str]) -> Dict[str, str]:
+    """Add "<id>N"/"<id>S" aliases for every known stop ID.
+
+    Realtime feeds report directional stop IDs; a directional ID missing
+    from stops.txt resolves through its base ID, as base_stop_id would.
+    Exact IDs always win over aliases, so a single dict lookup per
+    vehicle gives the same station as exact-then-base lookups.
+    """
+    extended = dict(stopid_to_station_key)
+    for sid, sk in stopid_to_station_key.items():
+        extended.setdefault(sid + "N", sk)
+        extended.setdefault(sid + "S", sk)
+    return extended
 
 
 def build_station_maps(stops_path: str, stations_csv: str) -> Tuple[Dict[str, str], Dict[str, str], Set[str]]:
@@ -35,67 +79,90 @@ def build_station_maps(stops_path: str, stations_csv: str) -> Tuple[Dict[str, st
     3. Merges them by base stop ID
     4. Assigns each stop to its parent (if exists) or complex (if exists)
 
-    Performance optimization: Caches the result to .cache/station_mappings.pkl
-    to avoid expensive pandas operations on every startup.
+    Performance optimization: Caches the result to .cache/station_mappings.json
+    to avoid re-reading both CSVs on every startup. The cache is
+    keyed on content hashes of both source files, so a touch or checkout
+    that leaves them unchanged does not force a rebuild.
 
     Args:
         stops_path: Path to stops.txt (GTFS)
         stations_csv: Path to stations.csv (MTA)
 
     Returns:
-        Tuple of (stopid_to_station_key, station_key_to_name, all_station_keys)
+        Tuple of (stopid_to_station_key, station_key_to_name, all_station_keys).
+        stopid_to_station_key also has directional aliases for every stop
+        (see _with_directional_ids), so callers need only one lookup.
     """
-    # Check if cache exists and is newer than source files
+    source_hashes = {
+        "stops_hash": _file_digest(stops_path),
+        "stations_hash": _file_digest(stations_csv),
+    }
+
+    # Check if cache exists and was built from the same source files
     if os.path.exists(CACHE_FILE):
         try:
-            cache_mtime = os.path.getmtime(CACHE_FILE)
-            stops_mtime = os.path.getmtime(stops_path)
-            stations_mtime = os.path.getmtime(stations_csv)
+            with open(CACHE_FILE, "rb") as f:
+                cached = json.loads(f.read())
+            if cached.get("version") != CACHE_VERSION:
+                raise ValueError(f"cache version {cached.get('version')!r} != {CACHE_VERSION}")
 
-            if cache_mtime > stops_mtime and cache_mtime > stations_mtime:
+            if all(cached.get(k) == v for k, v in source_hashes.items()):
                 logger.info("Loading station mappings from cache")
-                with open(CACHE_FILE, "rb") as f:
-                    cached = pickle.load(f)
-                logger.info(f"Loaded from cache: {len(cached[0])} stops → {len(cached[2])} stations")
-                return cached
+                stopid_to_station_key = cached["s2k"]
+                station_key_to_name = cached["k2n"]
+                all_station_keys = set(cached["keys"])
+                logger.info(f"Loaded from cache: {len(stopid_to_station_key)} stops → {len(all_station_keys)} stations")
+                return _with_directional_ids(stopid_to_station_key), station_key_to_name, all_station_keys
+            logger.info("Station source files changed, rebuilding mappings")
         except Exception as e:
             logger.warning(f"Failed to load cache: {e}, rebuilding...")
 
-    logger.info(f"Loading stops from {stops_path}")
-    stops = pd.read_csv(stops_path, dtype=str)
-    stops["stop_id"] = stops["stop_id"].str.upper()
-
-    if "parent_station" in stops.columns:
-        ps = stops["parent_station"].fillna("").str.upper()
-        stops["parent_or_self"] = np.where(ps.eq(""), stops["stop_id"], ps)
-    else:
-        logger.warning("No parent_station column found in stops.txt")
-        stops["parent_or_self"] = stops["stop_id"]
+    logger.info(f"Loading station complexes from {stations_csv}")
+    # Base stop ID → (complex ID, stop name); first row wins
+    complex_by_base: Dict[str, Tuple[str, Optional[str]]] = {}
+    for row in _read_csv_rows(stations_csv, ("GTFS Stop ID", "Complex ID", "Stop Name")):
+        base = base_stop_id(row["GTFS Stop ID"])
+        if base not in complex_by_base:
+            complex_by_base[base] = (str(row["Complex ID"]), row["Stop Name"])
 
-    stops["stop_id_base"] = stops["stop_id"].map(base_stop_id)
+    logger.info(f"Loading stops from {stops_path}")
+    stopid_to_station_key: Dict[str, str] = {}
+    station_key_to_name: Dict[str, Optional[str]] = {}
+    has_parent_column = None
+
+    for row in _read_csv_rows(stops_path, ("stop_id", "parent_station", "stop_name")):
+        if has_parent_column is None:
+            has_parent_column = "parent_station" in row
+            if not has_parent_column:
+                logger.warning("No parent_station column found in stops.txt")
+
+        if not row.get("stop_id"):
+            # Malformed line (blank stop_id): nothing to map
+            continue
+
+        stop_id = row["stop_id"].upper()
+        parent = (row.get("parent_station") or "").upper()
+        parent_or_self = parent or stop_id
+        base = base_stop_id(stop_id)
+        complex_info = complex_by_base.get(base)
+
+        if parent_or_self:
+            station_key = parent_or_self
+        elif complex_info is not None:
+            station_key = "CPLX_" + complex_info[0]
+        else:
+            station_key = base
+        stopid_to_station_key[stop_id] = station_key
+
+        # Display name: complex name if known, else the GTFS stop name;
+        # each station keeps the alphabetically first one
+        display_name = (complex_info[1] if complex_info else None) or row["stop_name"]
+        current = station_key_to_name.get(station_key)
+        if station_key not in station_key_to_name or (
+            display_name is not None and (current is None or display_name < current)
+        ):
+            station_key_to_name[station_key] = display_name
 
-    logger.info(f"Loading station complexes from {stations_csv}")
-    complex_df = pd.read_csv(stations_csv, dtype=str)
-    complex_df["GTFS Stop ID"] = complex_df["GTFS Stop ID"].str.upper()
-    complex_df["stop_id_base"] = complex_df["GTFS Stop ID"].map(base_stop_id)
-    complex_df["Complex ID"] = complex_df["Complex ID"].astype(str)
-
-    stops = stops.merge(
-        complex_df[["stop_id_base", "Complex ID", "Stop Name"]].drop_duplicates("stop_id_base"),
-        on="stop_id_base",
-        how="left"
-    )
-
-    stops["station_key"] = np.where(
-        stops["parent_or_self"].notna() & (stops["parent_or_self"] != ""),
-        stops["parent_or_self"],
-        np.where(stops["Complex ID"].notna(), "CPLX_" + stops["Complex ID"], stops["stop_id_base"]),
-    )
-    stops["display_name"] = stops["Stop Name"].fillna(stops["stop_name"])
-    name_map_df = stops.sort_values("display_name").groupby("station_key", as_index=False)["display_name"].first()
-
-    stopid_to_station_key = dict(zip(stops["stop_id"], stops["station_key"]))
-    station_key_to_name = dict(zip(name_map_df["station_key"], name_map_df["display_name"]))
     all_station_keys = set(station_key_to_name.keys())
 
     logger.info(f"Built mappings: {len(stopid_to_station_key)} stops → {len(all_station_keys)} stations")
@@ -103,13 +170,37 @@ def build_station_maps(stops_path: str, stations_csv: str) -> Tuple[Dict[str, st
     # Save to cache for faster future startups
     try:
         os.makedirs(CACHE_DIR, exist_ok=True)
-        with open(CACHE_FILE, "wb") as f:
-            pickle.dump((stopid_to_station_key, station_key_to_name, all_station_keys), f)
+        cached = {
+            "version": CACHE_VERSION,
+            **source_hashes,
+            "s2k": stopid_to_station_key,
+            "k2n": station_key_to_name,
+            "keys": sorted(all_station_keys),
+        }
+        with open(CACHE_FILE, "w", encoding="utf-8") as f:
+            json.dump(cached, f, ensure_ascii=False, separators=(",", ":"))
         logger.info(f"Saved station mappings to cache: {CACHE_FILE}")
     except Exception as e:
         logger.warning(f"Failed to save cache: {e}")
 
-    return stopid_to_station_key, station_key_to_name, all_station_keys
+    return _with_directional_ids(stopid_to_station_key), station_key_to_name, all_station_keys
+
+def restrict_stop_map(stopid_to_station_key: Dict[str, str], station_keys: Iterable[str]) -> Dict[str, str]:
+    """Blank out stops whose station is not in station_keys.
+
+    parse_blob skips blanked stops before building any per-station state,
+    while still treating them as known (not logged as unknown stop IDs).
+
+    Args:
+        stopid_to_station_key: Mapping from GTFS stop ID to station key
+        station_keys: Station keys to keep (e.g. the LED layout's keys)
+
+    Returns:
+        New mapping with "" for every stop outside station_keys
+    """
+    keep = set(station_keys)
+    return {sid: (sk if sk in keep else "") for sid, sk in stopid_to_station_key.items()}
+
 
 def load_layout(layout_path: str) -> Dict[str, int]:
     """Load LED layout mapping from CSV file.
@@ -120,8 +211,6 @@ def load_layout(layout_path: str) -> Dict[str, int]:
     Returns:
         Dictionary mapping station_key → LED index
     """
-    import csv
-
     logger.info(f"Loading layout from {layout_path}")
     mapping: Dict[str, int] = {}
     skipped = 0
@@ -1,37 +1,138 @@
-from typing import Dict, Tuple, Set, List
+from typing import Callable, Dict, Iterable, Tuple, Set, List, Optional
+from concurrent.futures import Executor, Future
+from functools import partial
 import logging
 from collections import defaultdict
 from google.transit import gtfs_realtime_pb2 as gtfs
 
 try:
-    from .mapping import base_stop_id
     from .config import MODE_OFF, MODE_SOLID, MODE_BLINK, MODE_PULSE
 except ImportError:
-    from src.mapping import base_stop_id
     from src.config import MODE_OFF, MODE_SOLID, MODE_BLINK, MODE_PULSE
 
 logger = logging.getLogger(__name__)
 
+# Per-blob result: (routes_by_station, mode_by_station, unknown_stops, vehicle_count)
+BlobStates = Tuple[Dict[str, Set[str]], Dict[str, int], Set[str], int]
 
-def aggregate_states_from_blobs(
-    blobs: List[bytes],
-    stopid_to_station_key: Dict[str, str],
-) -> Tuple[Dict[str, Set[str]], Dict[str, int]]:
-    """Parse GTFS realtime feed blobs and aggregate vehicle statuses.
+# VehicleStopStatus enum value → LED mode (ints, so no Name() lookup per vehicle)
+_MODE_FOR_STATUS = {
+    gtfs.VehiclePosition.STOPPED_AT: MODE_SOLID,
+    gtfs.VehiclePosition.INCOMING_AT: MODE_BLINK,
+    gtfs.VehiclePosition.IN_TRANSIT_TO: MODE_PULSE,
+}
+
+# Raw route_id → stripped, upper-cased route (a few dozen distinct values)
+_normalized_routes: Dict[str, str] = {}
+
+# Stop map held by each parse pool worker (set once by init_parse_worker)
+_worker_stop_map: Dict[str, str] = {}
 
-    For each vehicle, determines the LED mode based on its stop status:
-    - STOPPED_AT → SOLID (train at platform)
-    - INCOMING_AT → BLINK (train arriving)
-    - IN_TRANSIT_TO → PULSE (train departing)
+
+def parse_blob(blob: bytes, stopid_to_station_key: Dict[str, str]) -> BlobStates:
+    """Parse a single GTFS realtime blob into per-station states.
+
+    Top-level (picklable) so it can run in a process pool worker.
+
+    Args:
+        blob: GTFS protobuf binary message
+        stopid_to_station_key: Mapping from GTFS stop ID to station complex key,
+            including directional aliases (as returned by build_station_maps)
+
+    Returns:
+        Tuple of (routes_by_station, mode_by_station, unknown_stops, vehicle_count)
+
+    Raises:
+        google.protobuf.message.DecodeError: If the blob is not a valid FeedMessage
+    """
+    routes_by_station: Dict[str, Set[str]] = defaultdict(set)
+    mode_by_station: Dict[str, int] = {}
+    unknown_stops: Set[str] = set()
+    vehicle_count = 0
+
+    # Fresh message per blob on purpose: under the upb backend, reparsing
+    # into a reused FeedMessage keeps every earlier parse alive in its arena
+    # (unbounded memory growth) and is slower than allocating a new one
+    feed = gtfs.FeedMessage()
+    feed.ParseFromString(blob)
+
+    # Hot-loop bindings: local loads instead of attribute/global lookups
+    station_get = stopid_to_station_key.get
+    route_get = _normalized_routes.get
+    status_mode_get = _MODE_FOR_STATUS.get
+    mode_get = mode_by_station.get
+
+    for entity in feed.entity:
+        # HasField avoids materializing an empty vehicle for trip updates/alerts
+        if not entity.HasField("vehicle"):
+            continue
+        vehicle_count += 1
+        v = entity.vehicle
+        if not v.stop_id:
+            continue
+        # INCOMING_AT is enum 0, so status must not be truth-tested
+        status = v.current_status
+
+        # Map stop ID to station (the map already holds directional aliases).
+        # MTA stop IDs are already upper case, so only normalize on a miss.
+        raw_sid = v.stop_id
+        sk = station_get(raw_sid)
+        if sk is None:
+            raw_sid = raw_sid.upper()
+            sk = station_get(raw_sid)
+            if sk is None:
+                unknown_stops.add(raw_sid)
+                continue
+        if not sk:
+            # Known stop at a station that isn't displayed (see restrict_stop_map)
+            continue
+
+        route_id = v.trip.route_id
+        route = route_get(route_id)
+        if route is None:
+            route = _normalized_routes[route_id] = route_id.strip().upper()
+
+        mode = status_mode_get(status)
+        if mode:
+            # Update station state (inlined: a closure call per vehicle is measurable)
+            if route:
+                routes_by_station[sk].add(route)
+            if mode > mode_get(sk, MODE_OFF):
+                mode_by_station[sk] = mode
+
+    return routes_by_station, mode_by_station, unknown_stops, vehicle_count
+
+
+def init_parse_worker(stopid_to_station_key: Dict[str, str]) -> None:
+    """ProcessPoolExecutor initializer: keep the stop map in the worker.
+
+    The map is pickled once per worker at startup instead of once per
+    submitted blob.
 
     Args:
-        blobs: List of GTFS protobuf binary messages
         stopid_to_station_key: Mapping from GTFS stop ID to station complex key
+    """
+    global _worker_stop_map
+    _worker_stop_map = stopid_to_station_key
+
+
+def parse_blob_in_worker(blob: bytes) -> BlobStates:
+    """parse_blob using the stop map installed by init_parse_worker."""
+    return parse_blob(blob, _worker_stop_map)
+
+
+def _merge_blob_states(
+    results: Iterable[Callable[[], BlobStates]],
+    total: int,
+) -> Tuple[Dict[str, Set[str]], Dict[str, int], int]:
+    """Merge per-blob states (route union, max mode) and log a summary.
+
+    Args:
+        results: One zero-argument callable per blob returning its BlobStates
+        total: Number of blobs (for logging)
 
     Returns:
-        Tuple of:
-        - routes_by_station: Dict[station_key, Set[route_ids]]
-        - mode_by_station: Dict[station_key, max_led_mode]
+        Tuple of (routes_by_station, mode_by_station, vehicle_count)
     """
     routes_by_station: Dict[str, Set[str]] = defaultdict(set)
     mode_by_station: Dict[str, int] = {}
@@ -39,58 +140,81 @@ def aggregate_states_from_blobs(
     parse_errors = 0
     vehicle_count = 0
 
-    def add(sk: str, route: str, mode: int) -> None:
-        """Update or create station state."""
-        if route:
-            routes_by_station[sk].add(route)
-        cur = mode_by_station.get(sk, MODE_OFF)
-        if mode > cur:
-            mode_by_station[sk] = mode
-
-    feed = gtfs.FeedMessage()
-    for blob_num, blob in enumerate(blobs, start=1):
+    for blob_num, result in enumerate(results, start=1):
         try:
-            feed.ParseFromString(blob)
+            partial_routes, partial_modes, partial_unknown, partial_count = result()
         except Exception as e:
             logger.error(f"Failed to parse GTFS blob {blob_num}: {e}")
             parse_errors += 1
             continue
 
-        for entity in feed.entity:
-            v = entity.vehicle
-            if not v or not v.current_status or not v.stop_id:
-                continue
-
-            vehicle_count += 1
-            status = gtfs.VehiclePosition.VehicleStopStatus.Name(v.current_status)
-            raw_sid = (v.stop_id or "").upper()
-            route = (v.trip.route_id or "").strip().upper()
-
-            # Try to map stop ID to station
-            sk = (
-                stopid_to_station_key.get(raw_sid)
-                or stopid_to_station_key.get(base_stop_id(raw_sid))
-            )
-
-            if sk is None:
-                # Unknown stop - log once per stop ID
-                if raw_sid not in unknown_stops:
-                    logger.debug(f"Unknown stop ID: {raw_sid}")
-                    unknown_stops.add(raw_sid)
-                continue
-
-            if status == "STOPPED_AT":
-                add(sk, route, MODE_SOLID)
-            elif status == "INCOMING_AT":
-                add(sk, route, MODE_BLINK)
-            elif status == "IN_TRANSIT_TO":
-                add(sk, route, MODE_PULSE)
+        for sk, routes in partial_routes.items():
+            routes_by_station[sk] |= routes
+        for sk, mode in partial_modes.items():
+            if mode > mode_by_station.get(sk, MODE_OFF):
+                mode_by_station[sk] = mode
+        unknown_stops |= partial_unknown
+        vehicle_count += partial_count
 
     if parse_errors:
-        logger.warning(f"Failed to parse {parse_errors}/{len(blobs)} feed blobs")
+        logger.warning(f"Failed to parse {parse_errors}/{total} feed blobs")
 
     if unknown_stops:
+        for sid in sorted(unknown_stops):
+            logger.debug(f"Unknown stop ID: {sid}")
         logger.info(f"Encountered {len(unknown_stops)} unknown stop IDs (see debug log)")
 
     logger.debug(f"Processed {vehicle_count} vehicles → {len(mode_by_station)} active stations")
+    return routes_by_station, mode_by_station, vehicle_count
+
+
+def aggregate_states_from_futures(
+    futures: List[Future],
+) -> Tuple[Dict[str, Set[str]], Dict[str, int], int]:
+    """Aggregate vehicle statuses from parse_blob futures already submitted.
+
+    Lets callers submit each blob to a pool as soon as it is downloaded
+    and only join the parses once every feed has arrived.
+
+    Args:
+        futures: Futures returned by submitting parse_blob to an executor
+
+    Returns:
+        Tuple of (routes_by_station, mode_by_station, vehicle_count), where
+        vehicle_count is the number of vehicle positions across all feeds
+    """
+    return _merge_blob_states((fut.result for fut in futures), len(futures))
+
+
+def aggregate_states_from_blobs(
+    blobs: List[bytes],
+    stopid_to_station_key: Dict[str, str],
+    executor: Optional[Executor] = None,
+) -> Tuple[Dict[str, Set[str]], Dict[str, int]]:
+    """Parse GTFS realtime feed blobs and aggregate vehicle statuses.
+
+    For each vehicle, determines the LED mode based on its stop status:
+    - STOPPED_AT → SOLID (train at platform)
+    - INCOMING_AT → BLINK (train arriving)
+    - IN_TRANSIT_TO → PULSE (train departing)
+
+    Args:
+        blobs: List of GTFS protobuf binary messages
+        stopid_to_station_key: Mapping from GTFS stop ID to station complex key
+        executor: Optional pool to parse blobs in parallel (one task per blob)
+
+    Returns:
+        Tuple of:
+        - routes_by_station: Dict[station_key, Set[route_ids]]
+        - mode_by_station: Dict[station_key, max_led_mode]
+    """
+    if executor is not None:
+        # Fan out to the pool first so all blobs parse concurrently
+        routes_by_station, mode_by_station, _ = aggregate_states_from_futures(
+            [executor.submit(parse_blob, blob, stopid_to_station_key) for blob in blobs]
+        )
+    else:
+        routes_by_station, mode_by_station, _ = _merge_blob_states(
+            (partial(parse_blob, blob, stopid_to_station_key) for blob in blobs), len(blobs)
+        )
     return routes_by_station, mode_by_station
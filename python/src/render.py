@@ -1,11 +1,15 @@
-from typing import Dict, Set, List, Tuple
+from typing import Callable, Dict, Set, List, Tuple
 import logging
+from operator import itemgetter
+import numpy as np
 
 try:
     from .colors import choose_color_for_routes
+    from .serial_frame import PAYLOAD_DTYPE
     from .config import MODE_SOLID, MODE_BLINK, MODE_PULSE
 except ImportError:
     from src.colors import choose_color_for_routes
+    from src.serial_frame import PAYLOAD_DTYPE
     from src.config import MODE_SOLID, MODE_BLINK, MODE_PULSE
 
 logger = logging.getLogger(__name__)
@@ -32,19 +36,82 @@ def build_led_payload(
     """
     out: List[Tuple[int, int, int, int, int]] = []
 
-    for sk, mode in mode_by_station.items():
-        if sk not in layout:
-            continue
-
+    # Only stations on the strip (set intersection runs in C)
+    for sk in mode_by_station.keys() & layout.keys():
+        mode = mode_by_station[sk]
         idx = layout[sk]
         r, g, b = choose_color_for_routes(routes_by_station.get(sk, set()))
         out.append((idx, mode, r, g, b))
 
-    out.sort(key=lambda t: t[0])
+    out.sort(key=itemgetter(0))
     logger.debug(f"Built LED payload with {len(out)} active stations")
     return out
 
 
+# Signature of the builders returned by make_led_payload_builder
+PayloadBuilder = Callable[[Dict[str, Set[str]], Dict[str, int]], np.ndarray]
+
+
+def make_led_payload_builder(layout: Dict[str, int]) -> PayloadBuilder:
+    """Specialize build_led_payload for a layout that is fixed for the run.
+
+    The layout is pre-sorted by LED index and bound, with the color
+    chooser, as default arguments, so the per-station loop uses fast
+    local loads and needs no final sort.
+
+    The builder returns a PAYLOAD_DTYPE array (same rows as
+    build_led_payload) whose memory is already the serial wire layout,
+    so frame_bytes copies it in one block.
+
+    Args:
+        layout: Map of station key → LED index (position on strip)
+
+    Returns:
+        Function (routes_by_station, mode_by_station) → PAYLOAD_DTYPE array
+        sorted by LED index
+    """
+    # Stations in LED order, so rows come out sorted without a sort step.
+    # Indices are masked to the u16 wire field here, once, as frame_bytes
+    # does for list payloads (numpy rejects out-of-range ints).
+    stations_by_index = [
+        (sk, idx & 0xFFFF) for sk, idx in sorted(layout.items(), key=itemgetter(1))
+    ]
+
+    def build(
+        routes_by_station: Dict[str, Set[str]],
+        mode_by_station: Dict[str, int],
+        _stations=stations_by_index,
+        _choose=choose_color_for_routes,
+        _no_routes=frozenset(),
+    ) -> np.ndarray:
+        get_mode = mode_by_station.get
+        get_routes = routes_by_station.get
+        idxs = []
+        modes = []
+        colors = []
+
+        for sk, idx in _stations:
+            mode = get_mode(sk)
+            if mode is None:
+                continue
+            idxs.append(idx)
+            modes.append(mode & 0xFF)
+            colors.append(_choose(get_routes(sk, _no_routes)))
+
+        n = len(idxs)
+        out = np.empty(n, dtype=PAYLOAD_DTYPE)
+        out["idx"] = idxs
+        out["mode"] = modes
+        if n:
+            rgb = np.array(colors, dtype=np.uint8)
+            out["r"] = rgb[:, 0]
+            out["g"] = rgb[:, 1]
+            out["b"] = rgb[:, 2]
+        return out
+
+    return build
+
+
 def print_test_preview(
     t_ms: float,
     name_map: Dict[str, str],
@@ -1,6 +1,7 @@
-from typing import List, Tuple
+from typing import List, Optional, Tuple, Union
 import struct
 import logging
+import numpy as np
 
 logger = logging.getLogger(__name__)
 
@@ -8,91 +9,191 @@ logger = logging.getLogger(__name__)
 FRAME_HEADER_A = 0xAA
 FRAME_HEADER_B = 0x55
 
+# One station payload on the wire: <HBBBB, packed (6 bytes, no padding)
+PAYLOAD_DTYPE = np.dtype([("idx", "<u2"), ("mode", "u1"), ("r", "u1"), ("g", "u1"), ("b", "u1")])
+
+# Precompiled struct layouts (format parsed once, not on every pack)
+_HEADER = struct.Struct("<BBH")
+_PAYLOAD = struct.Struct("<HBBBB")
+
+# Serial writes are issued in blocks of this size
+SERIAL_CHUNK_SIZE = 512
+
+# Frame scratch buffer reused across polls; grows to the largest frame seen.
+# frame_bytes is only called from the poll loop, so it is not locked.
+_scratch = bytearray()
+
+# Port kept open across frames (reopening resets some ESP32 boards via DTR)
+_serial = None
+_serial_key: Optional[Tuple[str, int]] = None
+
 
 def simple_checksum(data: bytes) -> int:
     """Calculate simple checksum (sum of all bytes modulo 256).
 
     This matches the ESP32 firmware checksum implementation.
-    Used to verify data integrity in serial frames.
+    Used to verify data integrity in serial frames. The sum runs in numpy
+    over the caller's buffer (no copy), several times faster than sum()
+    for full frames.
 
     Args:
-        data: Bytes to checksum
+        data: Bytes-like object to checksum (bytes, bytearray, memoryview)
 
     Returns:
         8-bit checksum value (0-255)
     """
-    return sum(data) & 0xFF
+    return int(np.frombuffer(data, dtype=np.uint8).sum()) & 0xFF
 
 
-def frame_bytes(pairs: List[Tuple[int, int, int, int, int]]) -> bytes:
+def _pack_payloads(buf: bytearray, pairs: List[Tuple[int, int, int, int, int]]) -> None:
+    """Pack (led_index, mode, r, g, b) tuples into buf after the 4-byte header."""
+    pack_into = _PAYLOAD.pack_into
+    offset = 4
+    for idx, mode, r, g, b in pairs:
+        pack_into(buf, offset, idx & 0xFFFF, mode & 0xFF, r & 0xFF, g & 0xFF, b & 0xFF)
+        offset += 6
+
+
+def frame_bytes(pairs: Union[np.ndarray, List[Tuple[int, int, int, int, int]]]) -> bytes:
     """Build binary frame for serial transmission to ESP32.
 
     Frame format (matches ESP32 Protocol.h):
         [2 bytes] 0xAA 0x55 (header)
         [2 bytes] count of station payloads (little-endian)
-        [N×7 bytes] station payloads:
+        [N×6 bytes] station payloads:
             [2 bytes] LED index (little-endian)
             [1 byte]  LED mode (0=off, 1=solid, 2=blink, 3=pulse)
             [3 bytes] RGB color
         [1 byte]  checksum (sum of all bytes modulo 256)
 
+    A PAYLOAD_DTYPE array is already laid out like the wire payloads and
+    is copied into the frame in one block; a list of tuples is packed
+    entry by entry.
+
     Args:
-        pairs: List of (led_index, mode, r, g, b) tuples
+        pairs: PAYLOAD_DTYPE array or list of (led_index, mode, r, g, b) tuples
 
     Returns:
         Binary frame ready for serial transmission
     """
-    hdr = bytearray()
-    hdr.append(FRAME_HEADER_A)
-    hdr.append(FRAME_HEADER_B)
-    hdr += struct.pack("<H", len(pairs))
-
-    body = bytearray()
-    for idx, mode, r, g, b in pairs:
-        body += struct.pack(
-            "<HBBBB",
-            idx & 0xFFFF,
-            mode & 0xFF,
-            r & 0xFF,
-            g & 0xFF,
-            b & 0xFF,
-        )
-
-    data = bytes(hdr + body)
-    checksum = simple_checksum(data)
-    frame = data + bytes([checksum])
+    n = len(pairs)
+    body_end = 4 + 6 * n
+
+    # Header + payloads + checksum are filled in place in the shared
+    # scratch buffer; only the returned bytes are allocated per frame
+    buf = _scratch
+    if len(buf) < body_end + 1:
+        buf.extend(bytes(body_end + 1 - len(buf)))
+    _HEADER.pack_into(buf, 0, FRAME_HEADER_A, FRAME_HEADER_B, n)
+
+    # Released on exit: a live view would stop the buffer from growing
+    with memoryview(buf) as view:
+        if isinstance(pairs, np.ndarray):
+            packed = np.ascontiguousarray(pairs, dtype=PAYLOAD_DTYPE)
+            view[4:body_end] = packed.view(np.uint8)
+        else:
+            _pack_payloads(buf, pairs)
+
+        checksum = simple_checksum(view[:body_end])
+        buf[body_end] = checksum
+        frame = bytes(view[:body_end + 1])
 
     logger.debug(f"Built frame: {len(frame)} bytes, {len(pairs)} stations, checksum=0x{checksum:02X}")
     return frame
 
 
-def send_serial(port: str, baud: int, payload: bytes) -> None:
-    """Send payload to ESP32 over serial.
+def open_serial(port: str, baud: int):
+    """Open the serial port once and keep it for subsequent frames.
 
     Args:
         port: Serial port name (e.g., "COM5", "/dev/ttyUSB0")
         baud: Baud rate (typically 115200 or 2000000)
-        payload: Binary data to send
+
+    Returns:
+        Open serial.Serial instance
 
     Raises:
         RuntimeError: If pyserial not installed
         SerialException: If serial port cannot be opened
     """
+    global _serial, _serial_key
+
+    if _serial is not None and _serial_key == (port, baud) and _serial.is_open:
+        return _serial
+
     try:
         import serial  # Lazy import
     except ImportError:
         logger.error("pyserial not installed. Run: pip install pyserial")
         raise RuntimeError("pyserial required for serial mode")
 
+    close_serial()
+    logger.debug(f"Opening serial port {port} at {baud} baud")
+    ser = serial.Serial(port=port, baudrate=baud, timeout=1.0, write_timeout=1.0)
+    if hasattr(ser, "set_buffer_size"):
+        # Windows only: larger driver TX buffer so a whole frame queues at once
+        ser.set_buffer_size(rx_size=4096, tx_size=8192)
+
+    _serial = ser
+    _serial_key = (port, baud)
+    return ser
+
+
+def close_serial() -> None:
+    """Close the shared serial port, if open."""
+    global _serial, _serial_key
+
+    if _serial is not None:
+        try:
+            _serial.close()
+        except Exception as e:
+            logger.debug(f"Error closing serial port: {e}")
+        _serial = None
+        _serial_key = None
+
+
+def _write_frame(ser, payload: bytes) -> None:
+    """Write payload to an open port in SERIAL_CHUNK_SIZE blocks and flush."""
+    view = memoryview(payload)
+    for start in range(0, len(view), SERIAL_CHUNK_SIZE):
+        ser.write(view[start:start + SERIAL_CHUNK_SIZE])
+    ser.flush()
+
+
+def send_serial(port: str, baud: int, payload: bytes) -> None:
+    """Send payload to ESP32 over serial.
+
+    Reuses the port opened by open_serial (opening it on first use) and
+    writes the frame in SERIAL_CHUNK_SIZE blocks. If the port was lost
+    (e.g. the board was unplugged and re-enumerated), it is reopened and
+    the frame is sent once more. Write timeouts are not retried: reopening
+    toggles DTR, which resets some ESP32 boards.
+
+    Args:
+        port: Serial port name (e.g., "COM5", "/dev/ttyUSB0")
+        baud: Baud rate (typically 115200 or 2000000)
+        payload: Binary data to send
+
+    Raises:
+        RuntimeError: If pyserial not installed
+        SerialTimeoutException: If the write timed out
+        SerialException: If serial port cannot be opened or written after reopening
+    """
+    ser = open_serial(port, baud)
+    import serial  # Already imported by open_serial
+
     try:
-        logger.debug(f"Opening serial port {port} at {baud} baud")
-        with serial.Serial(port=port, baudrate=baud, timeout=1.0) as ser:
-            ser.write(payload)
-            ser.flush()
-            logger.debug(f"Sent {len(payload)} bytes to {port}")
-    except serial.SerialException as e:
-        logger.error(f"Serial error on {port}: {e}")
-        raise
-    except Exception as e:
-        logger.error(f"Unexpected error sending to {port}: {e}")
+        _write_frame(ser, payload)
+    except serial.SerialTimeoutException as e:
+        logger.error(f"Timed out sending to {port}: {e}")
         raise
+    except (serial.SerialException, OSError) as e:
+        logger.warning(f"Lost serial port {port}: {e}; reopening")
+        close_serial()
+        try:
+            _write_frame(open_serial(port, baud), payload)
+        except Exception as e:
+            logger.error(f"Error sending to {port}: {e}")
+            raise
+
+    logger.debug(f"Sent {len(payload)} bytes to {port}")
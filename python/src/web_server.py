@@ -1,10 +1,12 @@
 """Flask web server for MTA LED Board statistics and train arrivals."""
 from typing import Dict, Set, List, Tuple, Optional
+import heapq
 import logging
 import time
-from flask import Flask, jsonify, render_template, request
+from collections import Counter
+from itertools import chain
+from flask import Flask, Response, current_app, render_template, request
 from flask_cors import CORS
-from collections import defaultdict
 
 try:
     from .config import MODE_OFF, MODE_SOLID, MODE_BLINK, MODE_PULSE
@@ -13,7 +15,14 @@ except ImportError:
 
 logger = logging.getLogger(__name__)
 
-# Global state shared with main app
+try:
+    import orjson  # Rust encoder, several times faster than stdlib json
+except ImportError:
+    orjson = None
+
+# Latest snapshot from the main app. update_data swaps in a new dict and
+# never mutates a published one, so handlers read it without locking or
+# copying. Route sets are stored as sorted tuples, ready to serialize.
 _latest_data = {
     "routes_by_station": {},
     "mode_by_station": {},
@@ -32,6 +41,20 @@ def create_app():
                 static_folder='../../web/static')
     CORS(app)
 
+    # Rendered results per endpoint: endpoint -> (last_update, value). Data
+    # only changes once per poll, so most requests reuse the last render.
+    response_cache: Dict[str, Tuple[float, object]] = {}
+
+    def _cached(endpoint: str, data: dict, build):
+        """Return build(data), reusing the result until last_update changes."""
+        last_update = data.get("last_update", 0)
+        hit = response_cache.get(endpoint)
+        if hit is not None and hit[0] == last_update:
+            return hit[1]
+        value = build(data)
+        response_cache[endpoint] = (last_update, value)
+        return value
+
     @app.route('/')
     def index():
         """Main dashboard page."""
@@ -40,7 +63,11 @@ def create_app():
     @app.route('/api/stations')
     def get_stations():
         """Get list of all stations with their current status."""
-        data = _latest_data.copy()
+        body = _cached("stations", _latest_data, _render_stations)
+        return app.response_class(body, mimetype="application/json")
+
+    def _render_stations(data: dict) -> bytes:
+        """Build the /api/stations JSON body for a snapshot."""
         routes_by_station = data.get("routes_by_station", {})
         mode_by_station = data.get("mode_by_station", {})
         station_key_to_name = data.get("station_key_to_name", {})
@@ -54,7 +81,7 @@ def create_app():
             stations.append({
                 "key": sk,
                 "name": name,
-                "routes": sorted(list(routes)),
+                "routes": routes,
                 "mode": mode,
                 "mode_name": mode_name,
             })
@@ -62,7 +89,7 @@ def create_app():
         # Sort by name
         stations.sort(key=lambda s: s["name"])
 
-        return jsonify({
+        return _dumps({
             "stations": stations,
             "count": len(stations),
             "last_update": data.get("last_update", 0),
@@ -71,20 +98,20 @@ def create_app():
     @app.route('/api/station/<station_key>')
     def get_station_detail(station_key):
         """Get detailed information for a specific station."""
-        data = _latest_data.copy()
+        data = _latest_data
         routes_by_station = data.get("routes_by_station", {})
         mode_by_station = data.get("mode_by_station", {})
         station_key_to_name = data.get("station_key_to_name", {})
 
         if station_key not in routes_by_station:
-            return jsonify({"error": "Station not found or no trains"}), 404
+            return _json({"error": "Station not found or no trains"}, 404)
 
         name = station_key_to_name.get(station_key, station_key)
-        routes = sorted(list(routes_by_station[station_key]))
+        routes = routes_by_station[station_key]
         mode = mode_by_station.get(station_key, MODE_OFF)
         mode_name = _mode_to_string(mode)
 
-        return jsonify({
+        return _json({
             "key": station_key,
             "name": name,
             "routes": routes,
@@ -99,17 +126,17 @@ def create_app():
         """Search stations by name."""
         query = request.args.get('q', '').strip().lower()
         if not query:
-            return jsonify({"stations": []})
+            return _json({"stations": []})
 
-        data = _latest_data.copy()
-        station_key_to_name = data.get("station_key_to_name", {})
+        data = _latest_data
         routes_by_station = data.get("routes_by_station", {})
         mode_by_station = data.get("mode_by_station", {})
 
         results = []
-        for sk, name in station_key_to_name.items():
-            if query in name.lower():
-                routes = sorted(list(routes_by_station.get(sk, [])))
+        # Pre-lowercased and already in name order (see update_data)
+        for name_lower, sk, name in data.get("name_index", ()):
+            if query in name_lower:
+                routes = routes_by_station.get(sk, ())
                 mode = mode_by_station.get(sk, MODE_OFF)
 
                 results.append({
@@ -121,70 +148,65 @@ def create_app():
                     "has_trains": sk in routes_by_station,
                 })
 
-        # Sort by name
-        results.sort(key=lambda s: s["name"])
-
-        return jsonify({"stations": results})
+        return _json({"stations": results})
 
     @app.route('/api/statistics')
     def get_statistics():
         """Get system-wide statistics."""
-        data = _latest_data.copy()
+        data = _latest_data
+        stats = _cached("statistics", data, _compute_statistics)
+        return _json({
+            **stats,
+            "uptime": time.time() - data.get("start_time", time.time()),
+        })
+
+    def _compute_statistics(data: dict) -> dict:
+        """Build the snapshot-dependent part of /api/statistics."""
         routes_by_station = data.get("routes_by_station", {})
         mode_by_station = data.get("mode_by_station", {})
         station_key_to_name = data.get("station_key_to_name", {})
 
-        # Count by mode
-        mode_counts = defaultdict(int)
-        for mode in mode_by_station.values():
-            mode_counts[_mode_to_string(mode)] += 1
-
-        # Count by route
-        route_counts = defaultdict(int)
-        for routes in routes_by_station.values():
-            for route in routes:
-                route_counts[route] += 1
+        # Count by mode and by route (single C-level passes)
+        mode_counts = Counter(_mode_to_string(mode) for mode in mode_by_station.values())
+        route_counts = Counter(chain.from_iterable(routes_by_station.values()))
 
-        # Find busiest stations (most routes)
+        # Find busiest stations (most routes); only the top 20 get rendered
         busiest = []
-        for sk, routes in routes_by_station.items():
-            name = station_key_to_name.get(sk, sk)
+        for sk, routes in heapq.nlargest(20, routes_by_station.items(), key=lambda item: len(item[1])):
+            mode = mode_by_station.get(sk, MODE_OFF)
             busiest.append({
                 "key": sk,
-                "name": name,
+                "name": station_key_to_name.get(sk, sk),
                 "route_count": len(routes),
-                "routes": sorted(list(routes)),
-                "mode": mode_by_station.get(sk, MODE_OFF),
-                "mode_name": _mode_to_string(mode_by_station.get(sk, MODE_OFF)),
+                "routes": routes,
+                "mode": mode,
+                "mode_name": _mode_to_string(mode),
             })
 
-        busiest.sort(key=lambda x: x["route_count"], reverse=True)
-
         # Most active routes
         active_routes = [
             {"route": route, "station_count": count}
-            for route, count in sorted(route_counts.items(), key=lambda x: x[1], reverse=True)
+            for route, count in route_counts.most_common()
         ]
 
-        return jsonify({
+        return {
             "total_stations": len(station_key_to_name),
             "active_stations": len(routes_by_station),
             "total_vehicles": data.get("vehicle_count", 0),
             "feed_updates": data.get("feed_update_count", 0),
             "last_update": data.get("last_update", 0),
             "mode_breakdown": dict(mode_counts),
-            "busiest_stations": busiest[:20],  # Top 20
+            "busiest_stations": busiest,
             "active_routes": active_routes,
-            "uptime": time.time() - data.get("start_time", time.time()),
-        })
+        }
 
     @app.route('/api/health')
     def health():
         """Health check endpoint."""
-        data = _latest_data.copy()
+        data = _latest_data
         age = time.time() - data.get("last_update", 0)
 
-        return jsonify({
+        return _json({
             "status": "ok" if age < 60 else "stale",
             "last_update": data.get("last_update", 0),
             "age_seconds": age,
@@ -200,18 +222,42 @@ def update_data(
     layout: Dict[str, int],
     vehicle_count: int = 0,
 ):
-    """Update shared data from main app."""
+    """Update shared data from main app (atomic snapshot swap)."""
     global _latest_data
-    _latest_data["routes_by_station"] = routes_by_station
-    _latest_data["mode_by_station"] = mode_by_station
-    _latest_data["station_key_to_name"] = station_key_to_name
-    _latest_data["layout"] = layout
-    _latest_data["last_update"] = time.time()
-    _latest_data["vehicle_count"] = vehicle_count
-    _latest_data["feed_update_count"] = _latest_data.get("feed_update_count", 0) + 1
-
-    if "start_time" not in _latest_data:
-        _latest_data["start_time"] = time.time()
+    prev = _latest_data
+    now = time.time()
+
+    # Search index: (lowercase name, key, name) sorted by name. Station
+    # names only change on restart, so reuse it while the map is the same.
+    # Stations without a name (None in the map) are listed by their key.
+    name_index = prev.get("name_index")
+    if name_index is None or prev.get("station_key_to_name") is not station_key_to_name:
+        named = sorted((name or sk, sk) for sk, name in station_key_to_name.items())
+        name_index = tuple((name.lower(), sk, name) for name, sk in named)
+
+    _latest_data = {
+        "routes_by_station": {sk: tuple(sorted(routes)) for sk, routes in routes_by_station.items()},
+        "mode_by_station": mode_by_station,
+        "station_key_to_name": station_key_to_name,
+        "name_index": name_index,
+        "layout": layout,
+        "last_update": now,
+        "vehicle_count": vehicle_count,
+        "feed_update_count": prev.get("feed_update_count", 0) + 1,
+        "start_time": prev.get("start_time", now),
+    }
+
+
+def _dumps(obj) -> bytes:
+    """Encode obj as JSON bytes (orjson if installed, else Flask's encoder)."""
+    if orjson is not None:
+        return orjson.dumps(obj, option=orjson.OPT_NON_STR_KEYS | orjson.OPT_SORT_KEYS)
+    return current_app.json.dumps(obj).encode("utf-8")
+
+
+def _json(obj, status: int = 200) -> Response:
+    """Build a JSON response (replacement for flask.jsonify)."""
+    return current_app.response_class(_dumps(obj), status=status, mimetype="application/json")
 
 
 def _mode_to_string(mode: int) -> str:
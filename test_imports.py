@@ -21,6 +21,12 @@ try:
 except Exception as e:
     print(f"✗ colors imports FAILED: {e}")
 
+try:
+    from src.fetch_cache import start_poll, conditional_headers
+    print("✓ fetch_cache imports OK")
+except Exception as e:
+    print(f"✗ fetch_cache imports FAILED: {e}")
+
 try:
     from src.fetch_async import fetch_parallel_httpx
     print("✓ fetch_async imports OK")
@@ -28,7 +34,7 @@ except Exception as e:
     print(f"✗ fetch_async imports FAILED: {e}")
 
 try:
-    from src.fetch_threads import fetch_parallel_requests
+    from src.fetch_threads import fetch_sync_httpx
     print("✓ fetch_threads imports OK")
 except Exception as e:
     print(f"✗ fetch_threads imports FAILED: {e}")